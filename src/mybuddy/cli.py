@@ -26,47 +26,53 @@ def serve(
     uvicorn.run("mybuddy.web:create_app", host=host, port=port, reload=reload, factory=True)
 
 
+# Pending action items and reminders in one pass; actions sort first.
+_REMIND_SQL = """\
+SELECT 'action' AS kind, a.id AS id, NULL AS reminder_type, a.description AS text,
+       a.due_date, n.title AS source
+FROM action_items a
+JOIN notes n ON a.note_id = n.id
+WHERE a.is_completed = 0
+UNION ALL
+SELECT 'reminder', r.id, r.reminder_type, r.message, r.due_date, c.name
+FROM reminders r
+JOIN contacts c ON r.contact_id = c.id
+WHERE r.is_dismissed = 0
+ORDER BY kind, due_date, id"""
+
+
 @app.command()
 def remind() -> None:
     """Show pending action items and call reminders."""
     init_db()
 
+    actions: Table | None = None
+    reminders: Table | None = None
     with get_db() as db:
-        actions = db.execute(
-            """SELECT a.description, a.due_date, n.title as note_title
-               FROM action_items a
-               JOIN notes n ON a.note_id = n.id
-               WHERE a.is_completed = 0
-               ORDER BY a.due_date, a.id"""
-        ).fetchall()
+        for row in db.execute(_REMIND_SQL):
+            if row["kind"] == "action":
+                if actions is None:
+                    actions = Table(title="Pending Action Items")
+                    actions.add_column("Description", style="cyan")
+                    actions.add_column("Due Date", style="yellow")
+                    actions.add_column("From Note", style="dim")
+                actions.add_row(row["text"], row["due_date"] or "—", row["source"])
+            else:
+                if reminders is None:
+                    reminders = Table(title="Call / Follow-up Reminders")
+                    reminders.add_column("Type", style="magenta")
+                    reminders.add_column("Contact", style="cyan")
+                    reminders.add_column("Message", style="white")
+                    reminders.add_column("Due Date", style="yellow")
+                reminders.add_row(
+                    row["reminder_type"], row["source"], row["text"], row["due_date"] or "—"
+                )
 
-        reminders = db.execute(
-            """SELECT r.reminder_type, r.message, r.due_date, c.name as contact_name
-               FROM reminders r
-               JOIN contacts c ON r.contact_id = c.id
-               WHERE r.is_dismissed = 0
-               ORDER BY r.due_date, r.id"""
-        ).fetchall()
-
-    if not actions and not reminders:
+    if actions is None and reminders is None:
         console.print("[green]All clear! No pending items.[/green]")
         return
 
-    if actions:
-        table = Table(title="Pending Action Items")
-        table.add_column("Description", style="cyan")
-        table.add_column("Due Date", style="yellow")
-        table.add_column("From Note", style="dim")
-        for a in actions:
-            table.add_row(a["description"], a["due_date"] or "—", a["note_title"])
-        console.print(table)
-
-    if reminders:
-        table = Table(title="Call / Follow-up Reminders")
-        table.add_column("Type", style="magenta")
-        table.add_column("Contact", style="cyan")
-        table.add_column("Message", style="white")
-        table.add_column("Due Date", style="yellow")
-        for r in reminders:
-            table.add_row(r["reminder_type"], r["contact_name"], r["message"], r["due_date"] or "—")
-        console.print(table)
+    if actions is not None:
+        console.print(actions)
+    if reminders is not None:
+        console.print(reminders)
@@ -1,13 +1,28 @@
 from __future__ import annotations
 
+import os
+import queue
 import sqlite3
+import threading
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Generator
+from typing import Any, Generator, NamedTuple, TypeVar
 
 DB_DIR = Path.home() / ".mybuddy"
 DB_PATH = DB_DIR / "mybuddy.db"
 
+# Idle connections kept per database file; extra checkouts get a connection
+# that is closed instead of pooled when returned.
+POOL_SIZE = (os.cpu_count() or 1) * 4
+
+# Prepared statements kept per connection. Pooled connections live for the
+# whole process, so the cache covers every query the routes issue.
+STATEMENT_CACHE_SIZE = 256
+
+# Stored in PRAGMA user_version once SCHEMA has been applied. Bump it when
+# SCHEMA changes so existing databases pick up the new DDL.
+SCHEMA_VERSION = 2
+
 SCHEMA = """\
 CREATE TABLE IF NOT EXISTS notes (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -46,33 +61,198 @@ CREATE TABLE IF NOT EXISTS reminders (
     is_dismissed INTEGER NOT NULL DEFAULT 0,
     due_date TEXT NOT NULL DEFAULT ''
 );
+
+CREATE TABLE IF NOT EXISTS llm_cache (
+    input_hash TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    response_json TEXT NOT NULL,
+    created_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+);
+
+CREATE INDEX IF NOT EXISTS idx_action_items_note_id ON action_items(note_id);
+CREATE INDEX IF NOT EXISTS idx_action_items_completed_due ON action_items(is_completed, due_date, id);
+CREATE INDEX IF NOT EXISTS idx_note_contacts_contact ON note_contacts(contact_id);
+CREATE INDEX IF NOT EXISTS idx_reminders_contact_dismissed_due ON reminders(contact_id, is_dismissed, due_date);
+CREATE INDEX IF NOT EXISTS idx_notes_updated_at ON notes(updated_at DESC);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+    title, content, content='notes', content_rowid='id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+    INSERT INTO notes_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, title, content)
+    VALUES ('delete', old.id, old.title, old.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE ON notes BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, title, content)
+    VALUES ('delete', old.id, old.title, old.content);
+    INSERT INTO notes_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+END;
 """
 
+# Markers wrapped around matched text in search snippets; the routes escape
+# the snippet and swap these for <mark> tags.
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+
+
+_RowT = TypeVar("_RowT", bound=NamedTuple)
+
+# True when notes has rows but ANALYZE has never measured it
+_MISSING_STATS_SQL = """\
+SELECT EXISTS (SELECT 1 FROM notes)
+   AND NOT EXISTS (SELECT 1 FROM sqlite_stat1 WHERE tbl = 'notes')"""
+
+_pools: dict[str, queue.Queue[sqlite3.Connection]] = {}
+_pools_lock = threading.Lock()
+
 
 def _connect(db_path: Path | None = None) -> sqlite3.Connection:
-    conn = sqlite3.connect(str(db_path or DB_PATH))
+    # Connections are handed between threadpool workers, but only ever used
+    # by the one thread that has them checked out.
+    # The implicit transaction sqlite3 opens before the first write is
+    # BEGIN IMMEDIATE, so a get_db() block takes the write lock once, up front,
+    # and commits all of its writes together. Read-only blocks never open one.
+    conn = sqlite3.connect(
+        str(db_path or DB_PATH),
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        isolation_level="IMMEDIATE",
+    )
+    # Only takes effect on a new, empty database, and must precede the switch
+    # to WAL, after which the page size is fixed.
+    conn.execute("PRAGMA page_size=8192")
     conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
     conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-40000")
+    conn.execute("PRAGMA mmap_size=268435456")
     conn.row_factory = sqlite3.Row
     return conn
 
 
+def _pool(path: str) -> queue.Queue[sqlite3.Connection]:
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = queue.Queue(maxsize=POOL_SIZE)
+        return pool
+
+
+def _acquire(path: str) -> sqlite3.Connection:
+    try:
+        return _pool(path).get_nowait()
+    except queue.Empty:
+        return _connect(Path(path))
+
+
+def _release(path: str, conn: sqlite3.Connection) -> None:
+    try:
+        _pool(path).put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+def open_pool(db_path: Path | None = None) -> None:
+    """Prime the pool with one connection so the first request skips setup."""
+    path = str(db_path or DB_PATH)
+    _release(path, _acquire(path))
+
+
+def close_pool() -> None:
+    """Close every idle pooled connection."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        while True:
+            try:
+                conn = pool.get_nowait()
+            except queue.Empty:
+                break
+            # Refreshes statistics for the tables this connection queried,
+            # as SQLite recommends doing before closing long-lived connections
+            conn.execute("PRAGMA optimize")
+            conn.close()
+
+
 def init_db(db_path: Path | None = None) -> None:
     target = db_path or DB_PATH
     target.parent.mkdir(parents=True, exist_ok=True)
     conn = _connect(target)
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        # Schema is current; skip the DDL. The ANALYZE run at creation saw
+        # empty tables, so gather statistics once there is data to measure.
+        if conn.execute(_MISSING_STATS_SQL).fetchone()[0]:
+            conn.execute("ANALYZE")
+        conn.close()
+        return
+    has_fts = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'notes_fts'"
+    ).fetchone()
     conn.executescript(SCHEMA)
+    if not has_fts:
+        # Index notes written before the search table existed
+        conn.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+    conn.execute("ANALYZE")
     conn.close()
 
 
+def search_notes(db: sqlite3.Connection, q: str) -> list[sqlite3.Row]:
+    """Search note titles and content, best matches first."""
+    if len(q) < 3:
+        # The trigram index can't match fewer than three characters; escape
+        # LIKE wildcards so "%" or "_" only match themselves
+        escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"%{escaped}%"
+        return db.execute(
+            """SELECT id, title, created_at, substr(content, 1, 80) AS snippet
+               FROM notes WHERE title LIKE ? ESCAPE '\\' OR content LIKE ? ESCAPE '\\'
+               ORDER BY updated_at DESC""",
+            (pattern, pattern),
+        ).fetchall()
+    phrase = '"' + q.replace('"', '""') + '"'
+    return db.execute(
+        """SELECT n.id, n.title, n.created_at,
+                  snippet(notes_fts, 1, ?, ?, '…', 10) AS snippet
+           FROM notes_fts JOIN notes n ON n.id = notes_fts.rowid
+           WHERE notes_fts MATCH ?
+           ORDER BY bm25(notes_fts)""",
+        (SNIPPET_START, SNIPPET_END, phrase),
+    ).fetchall()
+
+
+def fetchall_as(
+    db: sqlite3.Connection, row_type: type[_RowT], sql: str, params: tuple[Any, ...] = ()
+) -> list[_RowT]:
+    """Run a query and return its rows as ``row_type`` named tuples.
+
+    Cheaper than sqlite3.Row for list pages that only read attributes.
+    """
+    cur = db.cursor()
+    cur.row_factory = None
+    return list(map(row_type._make, cur.execute(sql, params)))
+
+
 @contextmanager
 def get_db(db_path: Path | None = None) -> Generator[sqlite3.Connection, None, None]:
-    conn = _connect(db_path)
+    path = str(db_path or DB_PATH)
+    conn = _acquire(path)
     try:
         yield conn
         conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
     finally:
-        conn.close()
+        # Covers KeyboardInterrupt and other BaseExceptions too, so a pooled
+        # connection never carries an aborted block's writes to the next user
+        if conn.in_transaction:
+            conn.rollback()
+        _release(path, conn)
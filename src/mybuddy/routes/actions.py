@@ -1,9 +1,41 @@
 from __future__ import annotations
 
+import sqlite3
+from typing import NamedTuple
+
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
 
-from mybuddy.db import get_db
+from mybuddy.db import fetchall_as, get_db
+
+_SELECT_ACTIONS = """\
+SELECT a.id, a.note_id, a.description, a.is_completed, a.due_date, n.title as note_title
+FROM action_items a
+JOIN notes n ON a.note_id = n.id"""
+
+_LIST_PENDING_SQL = _SELECT_ACTIONS + " WHERE a.is_completed = 0 ORDER BY a.due_date, a.id"
+_LIST_COMPLETED_SQL = _SELECT_ACTIONS + " WHERE a.is_completed = 1 ORDER BY a.id DESC"
+_LIST_ALL_SQL = _SELECT_ACTIONS + " ORDER BY a.is_completed, a.due_date, a.id"
+_GET_ACTION_SQL = _SELECT_ACTIONS + " WHERE a.id = ?"
+
+_TOGGLE_SQL = "UPDATE action_items SET is_completed = NOT is_completed WHERE id = ?"
+_TOGGLE_RETURNING_SQL = (
+    _TOGGLE_SQL
+    + """ RETURNING id, note_id, description, is_completed, due_date,
+          (SELECT title FROM notes WHERE id = action_items.note_id) AS note_title"""
+)
+# RETURNING needs SQLite 3.35; older libraries re-select the toggled row
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+class _ActionRow(NamedTuple):
+    id: int
+    note_id: int
+    description: str
+    is_completed: int
+    due_date: str
+    note_title: str
+
 
 router = APIRouter(prefix="/actions", tags=["actions"])
 
@@ -13,72 +45,44 @@ def _templates(request: Request):
 
 
 @router.get("", response_class=HTMLResponse)
-async def list_actions(request: Request, filter: str = "all"):
+def list_actions(request: Request, filter: str = "all"):
+    if filter == "pending":
+        sql = _LIST_PENDING_SQL
+    elif filter == "completed":
+        sql = _LIST_COMPLETED_SQL
+    else:
+        sql = _LIST_ALL_SQL
     with get_db() as db:
-        if filter == "pending":
-            rows = db.execute(
-                """SELECT a.*, n.title as note_title FROM action_items a
-                   JOIN notes n ON a.note_id = n.id
-                   WHERE a.is_completed = 0
-                   ORDER BY a.due_date, a.id""",
-            ).fetchall()
-        elif filter == "completed":
-            rows = db.execute(
-                """SELECT a.*, n.title as note_title FROM action_items a
-                   JOIN notes n ON a.note_id = n.id
-                   WHERE a.is_completed = 1
-                   ORDER BY a.id DESC""",
-            ).fetchall()
-        else:
-            rows = db.execute(
-                """SELECT a.*, n.title as note_title FROM action_items a
-                   JOIN notes n ON a.note_id = n.id
-                   ORDER BY a.is_completed, a.due_date, a.id""",
-            ).fetchall()
+        rows = fetchall_as(db, _ActionRow, sql)
     return _templates(request).TemplateResponse(
         request, "actions/list.html", {"actions": rows, "filter": filter, "active": "actions"}
     )
 
 
 @router.post("/{action_id}/toggle", response_class=HTMLResponse)
-async def toggle_action(request: Request, action_id: int):
+def toggle_action(request: Request, action_id: int):
     with get_db() as db:
-        db.execute(
-            "UPDATE action_items SET is_completed = NOT is_completed WHERE id = ?",
-            (action_id,),
-        )
-        row = db.execute(
-            """SELECT a.*, n.title as note_title FROM action_items a
-               JOIN notes n ON a.note_id = n.id WHERE a.id = ?""",
-            (action_id,),
-        ).fetchone()
+        if _HAS_RETURNING:
+            # Drain the cursor so the UPDATE finishes before get_db() commits
+            rows = db.execute(_TOGGLE_RETURNING_SQL, (action_id,)).fetchall()
+            row = rows[0] if rows else None
+        else:
+            db.execute(_TOGGLE_SQL, (action_id,))
+            row = db.execute(_GET_ACTION_SQL, (action_id,)).fetchone()
     if not row:
         return HTMLResponse("Not found", status_code=404)
-    status = "completed" if row["is_completed"] else "pending"
-    checked = "checked" if row["is_completed"] else ""
-    return HTMLResponse(
-        f"""<tr id="action-{action_id}">
-            <td><input type="checkbox" {checked}
-                       hx-post="/actions/{action_id}/toggle"
-                       hx-target="#action-{action_id}"
-                       hx-swap="outerHTML"></td>
-            <td class="{'line-through' if row['is_completed'] else ''}">{row['description']}</td>
-            <td>{row['due_date'] or '—'}</td>
-            <td><a href="/notes/{row['note_id']}">{row['note_title']}</a></td>
-            <td><span class="tag {status}">{status}</span></td>
-        </tr>"""
-    )
+    return _templates(request).TemplateResponse(request, "actions/_row.html", {"action": row})
 
 
 @router.delete("/{action_id}")
-async def delete_action(request: Request, action_id: int):
+def delete_action(request: Request, action_id: int):
     with get_db() as db:
         db.execute("DELETE FROM action_items WHERE id = ?", (action_id,))
     return HTMLResponse("")
 
 
 @router.delete("")
-async def delete_completed_actions(request: Request):
+def delete_completed_actions(request: Request):
     with get_db() as db:
         db.execute("DELETE FROM action_items WHERE is_completed = 1")
     return HTMLResponse(headers={"HX-Redirect": "/actions"})
@@ -1,33 +1,42 @@
 from __future__ import annotations
 
+from typing import NamedTuple
+
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
 
-from mybuddy.db import get_db
+from mybuddy.db import fetchall_as, get_db
 
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 
 
+class _ContactRow(NamedTuple):
+    id: int
+    name: str
+    phone: str
+    email: str
+
+
 def _templates(request: Request):
     return request.app.state.templates
 
 
 @router.get("", response_class=HTMLResponse)
-async def list_contacts(request: Request):
+def list_contacts(request: Request):
     with get_db() as db:
-        rows = db.execute(
-            "SELECT * FROM contacts ORDER BY name"
-        ).fetchall()
+        rows = fetchall_as(
+            db, _ContactRow, "SELECT id, name, phone, email FROM contacts ORDER BY name"
+        )
     return _templates(request).TemplateResponse(
         request, "contacts/list.html", {"contacts": rows, "active": "contacts"}
     )
 
 
 @router.get("/{contact_id}", response_class=HTMLResponse)
-async def contact_detail(request: Request, contact_id: int):
+def contact_detail(request: Request, contact_id: int):
     with get_db() as db:
         contact = db.execute(
-            "SELECT * FROM contacts WHERE id = ?", (contact_id,)
+            "SELECT id, name, phone, email FROM contacts WHERE id = ?", (contact_id,)
         ).fetchone()
         if not contact:
             return HTMLResponse("Contact not found", status_code=404)
@@ -39,7 +48,8 @@ async def contact_detail(request: Request, contact_id: int):
             (contact_id,),
         ).fetchall()
         reminders = db.execute(
-            """SELECT * FROM reminders WHERE contact_id = ? ORDER BY due_date""",
+            """SELECT reminder_type, message, due_date FROM reminders
+               WHERE contact_id = ? ORDER BY due_date""",
             (contact_id,),
         ).fetchall()
     return _templates(request).TemplateResponse(
@@ -55,7 +65,7 @@ async def contact_detail(request: Request, contact_id: int):
 
 
 @router.delete("/{contact_id}")
-async def delete_contact(request: Request, contact_id: int):
+def delete_contact(request: Request, contact_id: int):
     with get_db() as db:
         db.execute("DELETE FROM contacts WHERE id = ?", (contact_id,))
     return HTMLResponse(headers={"HX-Redirect": "/contacts"})
@@ -1,17 +1,46 @@
 from __future__ import annotations
 
+import json
 import logging
+from typing import NamedTuple
 
-from fastapi import APIRouter, File, Form, Request, UploadFile
+from fastapi import APIRouter, BackgroundTasks, File, Form, Request, UploadFile
 from fastapi.responses import HTMLResponse, RedirectResponse
+from markupsafe import Markup, escape
 
-from mybuddy.db import get_db
+from mybuddy.db import SNIPPET_END, SNIPPET_START, fetchall_as, get_db, search_notes
 from mybuddy.services.ai import extract_from_note, extract_text_from_image
 
 logger = logging.getLogger(__name__)
 
 _ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
 _MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5 MB
+_READ_CHUNK_SIZE = 64 * 1024
+
+# JSON output is a valid JS string literal, but a "</script>" inside it would
+# still close the inline script, so markup characters are escaped as well.
+_SCRIPT_ESCAPE = str.maketrans({"<": "\\u003c", ">": "\\u003e", "&": "\\u0026"})
+
+_LIST_NOTES_SQL = "SELECT id, title, created_at FROM notes ORDER BY updated_at DESC"
+
+
+# Contacts linked to a note and to no other note, as an anti-join over the
+# contact_id index. Parameters: (note_id, note_id).
+_ORPHANED_CONTACTS_SQL = """\
+SELECT nc.contact_id FROM note_contacts nc
+LEFT JOIN note_contacts nc2 ON nc2.contact_id = nc.contact_id AND nc2.note_id != ?
+WHERE nc.note_id = ? AND nc2.contact_id IS NULL"""
+_DELETE_ORPHANED_REMINDERS_SQL = (
+    f"DELETE FROM reminders WHERE contact_id IN ({_ORPHANED_CONTACTS_SQL})"
+)
+_DELETE_ORPHANED_CONTACTS_SQL = f"DELETE FROM contacts WHERE id IN ({_ORPHANED_CONTACTS_SQL})"
+
+
+class _NoteRow(NamedTuple):
+    id: int
+    title: str
+    created_at: str
+
 
 router = APIRouter(prefix="/notes", tags=["notes"])
 
@@ -20,22 +49,91 @@ def _templates(request: Request):
     return request.app.state.templates
 
 
+def _highlight(snippet: str) -> Markup:
+    html = str(escape(snippet))
+    return Markup(html.replace(SNIPPET_START, "<mark>").replace(SNIPPET_END, "</mark>"))
+
+
+def _image_too_large() -> HTMLResponse:
+    return HTMLResponse(
+        '<div class="ocr-error" role="alert">Image too large. Maximum size is 5 MB.</div>',
+        status_code=422,
+    )
+
+
+def _cached_notes_list(request: Request) -> HTMLResponse:
+    """Serve the unfiltered notes page, rendering it only after a note changes."""
+    state = request.app.state
+    html = state.notes_list_html
+    if html is None:
+        version = state.notes_list_version
+        with get_db() as db:
+            rows = fetchall_as(db, _NoteRow, _LIST_NOTES_SQL)
+        html = (
+            _templates(request)
+            .get_template("notes/list.html")
+            .render(notes=rows, q="", active="notes")
+            .encode()
+        )
+        with state.notes_list_lock:
+            # Don't cache a page rendered from rows a concurrent write replaced
+            if state.notes_list_version == version:
+                state.notes_list_html = html
+    return HTMLResponse(html)
+
+
+def _invalidate_notes_list(request: Request) -> None:
+    state = request.app.state
+    with state.notes_list_lock:
+        state.notes_list_version += 1
+        state.notes_list_html = None
+
+
+def _insert_note(title: str, content: str) -> int:
+    with get_db() as db:
+        cur = db.execute(
+            "INSERT INTO notes (title, content) VALUES (?, ?)", (title, content)
+        )
+        return cur.lastrowid
+
+
+def _reset_note(note_id: int, title: str, content: str) -> None:
+    """Save the edited note and clear what was extracted from the old text."""
+    with get_db() as db:
+        db.execute(
+            "UPDATE notes SET title = ?, content = ?, updated_at = datetime('now') WHERE id = ?",
+            (title, content, note_id),
+        )
+        # Clear old extractions for this note
+        db.execute("DELETE FROM action_items WHERE note_id = ?", (note_id,))
+        # Delete reminders for contacts that aren't linked to any other note
+        db.execute(_DELETE_ORPHANED_REMINDERS_SQL, (note_id, note_id))
+        db.execute("DELETE FROM note_contacts WHERE note_id = ?", (note_id,))
+
+
 @router.get("", response_class=HTMLResponse)
-async def list_notes(request: Request):
+def list_notes(request: Request, q: str = ""):
+    q = q.strip()
+    if not q:
+        return _cached_notes_list(request)
     with get_db() as db:
-        rows = db.execute(
-            "SELECT id, title, created_at FROM notes ORDER BY updated_at DESC"
-        ).fetchall()
+        rows = [
+            {
+                "id": r["id"],
+                "title": r["title"],
+                "created_at": r["created_at"],
+                "snippet": _highlight(r["snippet"]),
+            }
+            for r in search_notes(db, q)
+        ]
     return _templates(request).TemplateResponse(
-        request, "notes/list.html", {"notes": rows, "active": "notes"}
+        request, "notes/list.html", {"notes": rows, "q": q, "active": "notes"}
     )
 
 
 @router.get("/new", response_class=HTMLResponse)
 async def new_note(request: Request):
-    return _templates(request).TemplateResponse(
-        request, "notes/form.html", {"note": None, "active": "notes"}
-    )
+    return HTMLResponse(request.app.state.new_note_html)
 
 
 @router.post("/ocr-image", response_class=HTMLResponse)
@@ -47,13 +145,14 @@ async def ocr_image(request: Request, file: UploadFile = File(...)):
             status_code=422,
         )
 
-    # Read and validate size
-    image_bytes = await file.read()
-    if len(image_bytes) > _MAX_IMAGE_SIZE:
-        return HTMLResponse(
-            '<div class="ocr-error" role="alert">Image too large. Maximum size is 5 MB.</div>',
-            status_code=422,
-        )
+    # Validate size, rejecting on the parsed size before reading anything
+    if file.size is not None and file.size > _MAX_IMAGE_SIZE:
+        return _image_too_large()
+    image_bytes = bytearray()
+    while chunk := await file.read(_READ_CHUNK_SIZE):
+        image_bytes += chunk
+        if len(image_bytes) > _MAX_IMAGE_SIZE:
+            return _image_too_large()
 
     try:
         text = await extract_text_from_image(image_bytes, file.content_type)
@@ -69,49 +168,58 @@ async def ocr_image(request: Request, file: UploadFile = File(...)):
             status_code=500,
         )
 
-    escaped = text.replace("\\", "\\\\").replace("`", "\\`").replace("$", "\\$")
+    literal = json.dumps(text).translate(_SCRIPT_ESCAPE)
     return HTMLResponse(
         f'<div class="ocr-success">Text extracted successfully.</div>'
         f"<script>"
-        f"(function(){{ var ta=document.getElementById('content'); var extracted=`{escaped}`;"
+        f"(function(){{ var ta=document.getElementById('content'); var extracted={literal};"
         f" if(ta.value.trim()) ta.value += '\\n\\n---\\n\\n' + extracted; else ta.value = extracted; }})()"
         f"</script>"
     )
 
 
 @router.post("")
-async def create_note(request: Request, title: str = Form(...), content: str = Form("")):
-    with get_db() as db:
-        cur = db.execute(
-            "INSERT INTO notes (title, content) VALUES (?, ?)", (title, content)
-        )
-        note_id = cur.lastrowid
+def create_note(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    title: str = Form(...),
+    content: str = Form(""),
+):
+    note_id = _insert_note(title, content)
+    _invalidate_notes_list(request)
 
-    # AI extraction (best-effort)
-    await extract_from_note(note_id, title, content)
+    # AI extraction (best-effort), run after the redirect is sent
+    background_tasks.add_task(extract_from_note, note_id, title, content)
 
     return RedirectResponse(url=f"/notes/{note_id}", status_code=303)
 
 
 @router.get("/{note_id}", response_class=HTMLResponse)
-async def detail_note(request: Request, note_id: int):
+def detail_note(request: Request, note_id: int):
     with get_db() as db:
-        note = db.execute("SELECT * FROM notes WHERE id = ?", (note_id,)).fetchone()
+        note = db.execute(
+            "SELECT id, title, content, created_at, updated_at FROM notes WHERE id = ?",
+            (note_id,),
+        ).fetchone()
         if not note:
             return HTMLResponse("Note not found", status_code=404)
         action_items = db.execute(
-            "SELECT * FROM action_items WHERE note_id = ?", (note_id,)
+            "SELECT id, description, is_completed, due_date FROM action_items WHERE note_id = ?",
+            (note_id,),
         ).fetchall()
         contacts = db.execute(
-            """SELECT c.* FROM contacts c
+            """SELECT c.id, c.name, c.phone, c.email FROM contacts c
                JOIN note_contacts nc ON c.id = nc.contact_id
                WHERE nc.note_id = ?""",
             (note_id,),
         ).fetchall()
         reminders = db.execute(
-            """SELECT r.*, c.name as contact_name FROM reminders r
-               JOIN contacts c ON r.contact_id = c.id
-               JOIN note_contacts nc ON nc.contact_id = c.id AND nc.note_id = ?""",
+            """SELECT r.reminder_type, r.message, r.due_date, c.name as contact_name
+               FROM note_contacts nc
+               JOIN reminders r ON r.contact_id = nc.contact_id
+               JOIN contacts c ON c.id = nc.contact_id
+               WHERE nc.note_id = ?
+               ORDER BY r.due_date, r.id""",
             (note_id,),
         ).fetchall()
     return _templates(request).TemplateResponse(
@@ -128,9 +236,11 @@ async def detail_note(request: Request, note_id: int):
 
 
 @router.get("/{note_id}/edit", response_class=HTMLResponse)
-async def edit_note(request: Request, note_id: int):
+def edit_note(request: Request, note_id: int):
     with get_db() as db:
-        note = db.execute("SELECT * FROM notes WHERE id = ?", (note_id,)).fetchone()
+        note = db.execute(
+            "SELECT id, title, content FROM notes WHERE id = ?", (note_id,)
+        ).fetchone()
         if not note:
             return HTMLResponse("Note not found", status_code=404)
     return _templates(request).TemplateResponse(
@@ -139,54 +249,28 @@ async def edit_note(request: Request, note_id: int):
 
 
 @router.post("/{note_id}/update")
-async def update_note(
-    request: Request, note_id: int, title: str = Form(...), content: str = Form("")
+def update_note(
+    request: Request,
+    note_id: int,
+    background_tasks: BackgroundTasks,
+    title: str = Form(...),
+    content: str = Form(""),
 ):
-    with get_db() as db:
-        db.execute(
-            "UPDATE notes SET title = ?, content = ?, updated_at = datetime('now') WHERE id = ?",
-            (title, content, note_id),
-        )
-        # Clear old extractions for this note
-        db.execute("DELETE FROM action_items WHERE note_id = ?", (note_id,))
-        # Get contact ids linked to this note for reminder cleanup
-        contact_ids = [
-            r["contact_id"]
-            for r in db.execute(
-                "SELECT contact_id FROM note_contacts WHERE note_id = ?", (note_id,)
-            ).fetchall()
-        ]
-        # Delete reminders linked to these contacts (from this note only)
-        for cid in contact_ids:
-            # Only delete if contact isn't linked to other notes
-            other = db.execute(
-                "SELECT 1 FROM note_contacts WHERE contact_id = ? AND note_id != ?",
-                (cid, note_id),
-            ).fetchone()
-            if not other:
-                db.execute("DELETE FROM reminders WHERE contact_id = ?", (cid,))
-        db.execute("DELETE FROM note_contacts WHERE note_id = ?", (note_id,))
+    _reset_note(note_id, title, content)
+    _invalidate_notes_list(request)
 
-    # Re-extract
-    await extract_from_note(note_id, title, content)
+    # Re-extract after the redirect is sent
+    background_tasks.add_task(extract_from_note, note_id, title, content)
 
     return RedirectResponse(url=f"/notes/{note_id}", status_code=303)
 
 
 @router.delete("/{note_id}")
-async def delete_note(request: Request, note_id: int):
+def delete_note(request: Request, note_id: int):
     with get_db() as db:
-        # Collect contacts only linked to this note
-        orphan_contacts = db.execute(
-            """SELECT contact_id FROM note_contacts
-               WHERE note_id = ? AND contact_id NOT IN (
-                   SELECT contact_id FROM note_contacts WHERE note_id != ?
-               )""",
-            (note_id, note_id),
-        ).fetchall()
+        # Delete contacts only linked to this note (reminders cascade from contacts)
+        db.execute(_DELETE_ORPHANED_CONTACTS_SQL, (note_id, note_id))
         # Cascade handles action_items, note_contacts
         db.execute("DELETE FROM notes WHERE id = ?", (note_id,))
-        # Clean up orphaned contacts (reminders cascade from contacts)
-        for row in orphan_contacts:
-            db.execute("DELETE FROM contacts WHERE id = ?", (row["contact_id"],))
+    _invalidate_notes_list(request)
     return HTMLResponse(headers={"HX-Redirect": "/notes"})
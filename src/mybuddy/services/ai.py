@@ -1,17 +1,33 @@
 from __future__ import annotations
 
+import asyncio
 import base64
+import functools
+import hashlib
 import json
 import logging
 import os
 import re
-
-import anthropic
+from typing import TYPE_CHECKING
 
 from mybuddy.db import get_db
 
+if TYPE_CHECKING:
+    import anthropic
+    import openai
+
 logger = logging.getLogger(__name__)
 
+CLAUDE_MODEL = "claude-sonnet-4-20250514"
+
+# Cached Claude replies expire after a week: the prompt resolves relative
+# dates like "Monday" against the day the note was extracted
+_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# Bump whenever EXTRACTION_PROMPT or the note framing in extract_from_note
+# changes so cached extractions are not reused
+PROMPT_VERSION = "v1"
+
 EXTRACTION_PROMPT = """\
 Analyze the following note and extract structured information as JSON.
 
@@ -26,54 +42,119 @@ Rules:
 - If no items found for a category, return an empty list
 - Return ONLY valid JSON, no markdown fences or extra text
 
-Note title: {title}
-Note content:
-{content}
 """
 
-# Patterns for rule-based fallback
-_ACTION_PATTERNS = [
-    r"(?i)\b(need\s+to\b\s+.+?)(?:\.|$)",
-    r"(?i)\b(should\b\s+.+?)(?:\.|$)",
-    r"(?i)\b(have\s+to\b\s+.+?)(?:\.|$)",
-    r"(?i)\b(must\b\s+.+?)(?:\.|$)",
-    r"(?i)\btodo\b[:\s]+(.+?)(?:\.|$)",
-    r"(?i)\b(follow\s*up\b\s*(?:with\s+)?.+?)(?:\.|$)",
-    r"(?i)\b(touch\s+base\b\s*.+?)(?:\.|$)",
-    r"(?i)\b(keep\s+in\s+touch\b.+?)(?:\.|$)",
-    r"(?i)\bremind(?:er)?\b[:\s]+(.+?)(?:\.|$)",
-    r"(?i)\b(schedule\b\s+.+?)(?:\.|$)",
-    r"(?i)\b(send\b\s+.+?)(?:\.|$)",
-    r"(?i)\b(review\b\s+.+?)(?:\.|$)",
-    r"(?i)\b(call\b\s+.+?)(?:\.|$)",
-]
-
-_CALL_PATTERNS = [
-    r"(?i)\bcall\b\s+(\w+)",
-    r"(?i)\bphone\b\s+(\w+)",
-    r"(?i)\bring\b\s+(\w+)",
-]
-
-_FOLLOWUP_PATTERNS = [
-    r"(?i)\bfollow\s*up\b\s*(?:with\s+)?(\w+)",
-    r"(?i)\btouch\s+base\b\s*(?:with\s+)?(\w+)",
-    r"(?i)\bkeep\s+in\s+touch\b.*?(?:with\s+)?(\w+)",
-    r"(?i)\bcheck\s+(?:in|back)\b\s*(?:with\s+)?(\w+)",
-]
+# A reply wrapped in a markdown fence despite the prompt: drops the opening
+# line and everything from the last closing fence on, which may be missing.
+_FENCE_RE = re.compile(r"```[^\n]*\n(?:(.*)```|(.*))", re.DOTALL)
+
+# Patterns for rule-based fallback, each with one capture group. Within a
+# list, patterns are tried in order, so earlier ones win when extracted
+# actions overlap. Action text is one character followed by a possessive run
+# up to the next "." or line end: the same span a lazy ".+?" would find, but
+# without retrying the terminator after every character.
+_ACTION_PATTERNS = (
+    r"\b(need\s+to\b\s+.[^.\n]*+)(?:\.|$)",
+    r"\b(should\b\s+.[^.\n]*+)(?:\.|$)",
+    r"\b(have\s+to\b\s+.[^.\n]*+)(?:\.|$)",
+    r"\b(must\b\s+.[^.\n]*+)(?:\.|$)",
+    r"\btodo\b[:\s]+(.[^.\n]*+)(?:\.|$)",
+    r"\b(follow\s*up\b\s*(?:with\s+)?.[^.\n]*+)(?:\.|$)",
+    r"\b(touch\s+base\b\s*.[^.\n]*+)(?:\.|$)",
+    r"\b(keep\s+in\s+touch\b.[^.\n]*+)(?:\.|$)",
+    r"\bremind(?:er)?\b[:\s]+(.[^.\n]*+)(?:\.|$)",
+    r"\b(schedule\b\s+.[^.\n]*+)(?:\.|$)",
+    r"\b(send\b\s+.[^.\n]*+)(?:\.|$)",
+    r"\b(review\b\s+.[^.\n]*+)(?:\.|$)",
+    r"\b(call\b\s+.[^.\n]*+)(?:\.|$)",
+)
+
+_CALL_PATTERNS = (
+    r"\bcall\b\s+(\w+)",
+    r"\bphone\b\s+(\w+)",
+    r"\bring\b\s+(\w+)",
+)
+
+_FOLLOWUP_PATTERNS = (
+    r"\bfollow\s*up\b\s*(?:with\s+)?(\w+)",
+    r"\btouch\s+base\b\s*(?:with\s+)?(\w+)",
+    r"\bkeep\s+in\s+touch\b.*?(?:with\s+)?(\w+)",
+    r"\bcheck\s+(?:in|back)\b\s*(?:with\s+)?(\w+)",
+)
+
+
+def _fuse(patterns: tuple[str, ...], flags: int = 0) -> re.Pattern[str]:
+    """Combine patterns into one alternation that scans the text once.
+
+    Each alternative sits in a lookahead so matches of different patterns can
+    overlap, as they would with one finditer per pattern. This relies on no two
+    patterns in a list starting with the same keyword.
+    """
+    # Every pattern starts with \b and a literal keyword; checking the first
+    # letter up front lets the scan skip most positions cheaply.
+    initials = "".join(sorted({p.removeprefix(r"\b").lstrip("(")[0] for p in patterns}))
+    alternatives = "|".join(f"(?=(?P<p{i}>{p}))" for i, p in enumerate(patterns))
+    return re.compile(f"(?=[{initials}])(?:{alternatives})", re.IGNORECASE | flags)
+
+
+def _scan(fused: re.Pattern[str], count: int, text: str) -> list[tuple[int, int, str, str]]:
+    """Return (pattern index, start, match, group 1) for every match of a fused
+    pattern, ordered as if each pattern had been run over the text in turn."""
+    hits = []
+    ends = [0] * count
+    for m in fused.finditer(text):
+        group = m.lastindex  # the alternative's outer group; its capture follows
+        i = (group - 1) // 2
+        start, end = m.span(group)
+        # A single-pattern scan resumes after its previous match
+        if start < ends[i]:
+            continue
+        ends[i] = end
+        hits.append((i, start, m.group(group), m.group(group + 1)))
+    hits.sort()
+    return hits
+
+
+# Bounds on the line-by-line fallback used when a note names contacts but no
+# action patterns match, so long OCR'd notes don't become hundreds of items.
+_FALLBACK_MAX_LINES = 50
+_FALLBACK_MAX_ITEMS = 10
+
+# Keywords at least one of which must appear for any pattern in the family
+# to match. The gates use IGNORECASE like the patterns, so they agree on
+# characters such as dotless "ı" that casefolding would not map to "i".
+_ACTION_KEYWORDS = (
+    "need", "should", "have", "must", "todo", "follow", "touch", "remind",
+    "schedule", "send", "review", "call",
+)
+_NAME_KEYWORDS = ("call", "phone", "ring", "follow", "touch", "check")
+_ACTION_GATE = re.compile("|".join(_ACTION_KEYWORDS), re.IGNORECASE)
+_NAME_GATE = re.compile("|".join(_NAME_KEYWORDS), re.IGNORECASE)
+
+# Action patterns end at "." or a line end, so they need MULTILINE for "$";
+# the name patterns have no anchors.
+_ACTION_RE = _fuse(_ACTION_PATTERNS, re.MULTILINE)
+_NAME_RE = _fuse(_CALL_PATTERNS + _FOLLOWUP_PATTERNS)
+
+_TITLE_NAME_RE = re.compile(r"(?i)\bwith\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)")
+
+# Input bytes per base64 chunk for image uploads; a multiple of 3 so chunks
+# encode without padding and concatenate cleanly.
+_B64_CHUNK_SIZE = 3 * 64 * 1024
 
 # Words that look like names but aren't
-_STOP_WORDS = {
+_STOP_WORDS = frozenset({
     "me", "him", "her", "them", "us", "it", "this", "that", "the", "a", "an",
     "and", "or", "but", "in", "on", "at", "to", "for", "of", "with", "about",
     "back", "up", "out", "my", "your", "his", "their", "our", "via", "email",
     "phone", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday",
     "sunday", "tomorrow", "today", "next", "week", "month", "year", "asap",
-}
+})
 
 
 def _extract_name_from_title(title: str) -> str | None:
     """Try to extract a person's name from 'Meeting with X' style titles."""
-    m = re.search(r"(?i)\bwith\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)", title)
+    m = _TITLE_NAME_RE.search(title)
     if m:
         return m.group(1)
     return None
@@ -83,25 +164,38 @@ def _rule_based_extract(title: str, content: str) -> dict:
     """Fallback extraction using regex patterns."""
     text = f"{title}\n{content}"
     data: dict = {"action_items": [], "contacts": [], "reminders": []}
-    seen_actions: set[str] = set()
+    seen_actions: list[str] = []
+    seen_blob = ""
+
+    # Each pattern needs one of its family's keywords, so one search for
+    # them can rule out a whole scan
+    if _ACTION_GATE.search(text):
+        action_hits = _scan(_ACTION_RE, len(_ACTION_PATTERNS), text)
+    else:
+        action_hits = []
+    if _NAME_GATE.search(text):
+        name_hits = _scan(_NAME_RE, len(_CALL_PATTERNS) + len(_FOLLOWUP_PATTERNS), text)
+    else:
+        name_hits = []
 
     # Extract action items
-    for pattern in _ACTION_PATTERNS:
-        for m in re.finditer(pattern, text, re.MULTILINE):
-            desc = m.group(1).strip().rstrip(".,;!").strip()
-            if not desc or len(desc) <= 3:
-                continue
-            lower = desc.lower()
-            # Skip if duplicate or substring of an already-captured item
-            if any(lower in s or s in lower for s in seen_actions):
-                continue
-            # Remove existing items that are substrings of this new one
-            seen_actions = {s for s in seen_actions if s not in lower}
-            data["action_items"] = [
-                a for a in data["action_items"] if a["description"].lower() not in lower
-            ]
-            seen_actions.add(lower)
-            data["action_items"].append({"description": desc, "due_date": ""})
+    for _, _, _, desc in action_hits:
+        desc = desc.strip().rstrip(".,;!").strip()
+        if not desc or len(desc) <= 3:
+            continue
+        lower = desc.lower()
+        # Skip duplicates and anything overlapping an already-captured item.
+        # One search of the NUL-joined blob checks whether this description
+        # sits inside any earlier one.
+        if "\0" in lower:
+            inside_seen = any(lower in s for s in seen_actions)
+        else:
+            inside_seen = lower in seen_blob
+        if inside_seen or any(s in lower for s in seen_actions):
+            continue
+        seen_actions.append(lower)
+        seen_blob += lower + "\0"
+        data["action_items"].append({"description": desc, "due_date": ""})
 
     # Extract contacts from title
     contact_names: set[str] = set()
@@ -109,148 +203,225 @@ def _rule_based_extract(title: str, content: str) -> dict:
     if title_name:
         contact_names.add(title_name)
 
-    # Extract contacts from call/followup patterns
-    for pattern in _CALL_PATTERNS + _FOLLOWUP_PATTERNS:
-        for m in re.finditer(pattern, text, re.MULTILINE):
-            name = m.group(1).strip()
-            if name.lower() not in _STOP_WORDS and name[0].isupper():
-                contact_names.add(name)
+    # Extract contacts and reminders from call/followup patterns
+    for i, _, line, name in name_hits:
+        # Names are \w+ captures, so never empty or padded. Most are lowercase
+        # words, which the capital check rules out before the set lookup.
+        if name[0].isupper() and name.lower() not in _STOP_WORDS:
+            contact_names.add(name)
+            data["reminders"].append(
+                {
+                    "contact_name": name,
+                    "type": "call" if i < len(_CALL_PATTERNS) else "follow_up",
+                    "message": line.strip(),
+                    "due_date": "",
+                }
+            )
 
     for name in contact_names:
         data["contacts"].append({"name": name, "phone": "", "email": ""})
 
-    # Extract reminders
-    for pattern in _CALL_PATTERNS:
-        for m in re.finditer(pattern, text, re.MULTILINE):
-            name = m.group(1).strip()
-            if name.lower() not in _STOP_WORDS and name[0].isupper():
-                line = m.group(0).strip()
-                data["reminders"].append(
-                    {"contact_name": name, "type": "call", "message": line, "due_date": ""}
-                )
-
-    for pattern in _FOLLOWUP_PATTERNS:
-        for m in re.finditer(pattern, text, re.MULTILINE):
-            name = m.group(1).strip()
-            if name.lower() not in _STOP_WORDS and name[0].isupper():
-                line = m.group(0).strip()
-                data["reminders"].append(
-                    {"contact_name": name, "type": "follow_up", "message": line, "due_date": ""}
-                )
-
     # If we found contacts but no specific call/followup lines, check full sentences
     if contact_names and not data["action_items"]:
-        for line in text.splitlines():
+        # maxsplit stops splitting once the line budget is covered; strip()
+        # below drops the "\r" of CRLF line endings
+        for line in text.split("\n", _FALLBACK_MAX_LINES)[:_FALLBACK_MAX_LINES]:
             line = line.strip()
             if line and len(line) > 5:
                 data["action_items"].append({"description": line, "due_date": ""})
+                if len(data["action_items"]) == _FALLBACK_MAX_ITEMS:
+                    break
 
     return data
 
 
+@functools.lru_cache(maxsize=1)
+def _anthropic_client(api_key: str) -> anthropic.AsyncAnthropic:
+    """Shared Claude client, so calls reuse one HTTP connection pool."""
+    # Imported here so the rule-based path never loads the SDK
+    import anthropic
+
+    return anthropic.AsyncAnthropic(api_key=api_key)
+
+
+@functools.lru_cache(maxsize=1)
+def _openai_client(api_key: str) -> openai.AsyncOpenAI:
+    """Shared OpenAI client, so calls reuse one HTTP connection pool."""
+    import openai
+
+    return openai.AsyncOpenAI(api_key=api_key)
+
+
 async def extract_from_note(note_id: int, title: str, content: str) -> None:
     """Extract action items, contacts, and reminders. Uses Claude if available, else regex fallback."""
     api_key = os.environ.get("ANTHROPIC_API_KEY", "")
 
     data = None
     if api_key:
+        key = hashlib.sha256(
+            f"{PROMPT_VERSION}\0{CLAUDE_MODEL}\0{title}\0{content}".encode()
+        ).hexdigest()
+        try:
+            data = await asyncio.to_thread(_cached_extraction, key)
+        except Exception:
+            logger.exception("Failed to read cached AI extraction")
+    if api_key and data is None:
         try:
-            client = anthropic.Anthropic(api_key=api_key)
-            message = client.messages.create(
-                model="claude-sonnet-4-20250514",
+            message = await _anthropic_client(api_key).messages.create(
+                model=CLAUDE_MODEL,
                 max_tokens=1024,
                 messages=[
                     {
                         "role": "user",
-                        "content": EXTRACTION_PROMPT.format(title=title, content=content),
+                        "content": (
+                            f"{EXTRACTION_PROMPT}Note title: {title}\n"
+                            f"Note content:\n{content}\n"
+                        ),
                     }
                 ],
             )
             raw = message.content[0].text.strip()
-            if raw.startswith("```"):
-                raw = raw.split("\n", 1)[1]
-                raw = raw.rsplit("```", 1)[0]
-            data = json.loads(raw)
+            if fenced := _FENCE_RE.match(raw):
+                raw = fenced[fenced.lastindex]
+            parsed = json.loads(raw)
+            if not isinstance(parsed, dict):
+                raise ValueError(f"expected a JSON object, got {type(parsed).__name__}")
+            data = parsed
         except Exception:
             logger.exception("AI extraction failed, falling back to rule-based extraction")
+        else:
+            try:
+                await asyncio.to_thread(_store_extraction, key, data)
+            except Exception:
+                # The reply is still used; only the next identical note misses
+                logger.exception("Failed to cache AI extraction")
 
     if data is None:
         logger.info("Using rule-based extraction")
         data = _rule_based_extract(title, content)
 
-    _save_extractions(note_id, data)
+    await asyncio.to_thread(_save_extractions, note_id, title, content, data)
 
 
-def _save_extractions(note_id: int, data: dict) -> None:
-    """Persist extracted action items, contacts, and reminders."""
+def _cached_extraction(key: str) -> dict | None:
+    """Return a recent Claude extraction for the same note text, if any."""
     with get_db() as db:
-        # Action items
-        for item in data.get("action_items", []):
-            db.execute(
-                "INSERT INTO action_items (note_id, description, due_date) VALUES (?, ?, ?)",
-                (note_id, item["description"], item.get("due_date", "")),
-            )
+        row = db.execute(
+            """SELECT response_json FROM llm_cache
+               WHERE input_hash = ? AND created_at > CAST(strftime('%s', 'now') AS INTEGER) - ?""",
+            (key, _CACHE_TTL_SECONDS),
+        ).fetchone()
+    if not row:
+        return None
+    data = json.loads(row["response_json"])
+    return data if isinstance(data, dict) else None
+
+
+def _store_extraction(key: str, data: dict) -> None:
+    with get_db() as db:
+        db.execute(
+            "DELETE FROM llm_cache WHERE created_at <= CAST(strftime('%s', 'now') AS INTEGER) - ?",
+            (_CACHE_TTL_SECONDS,),
+        )
+        db.execute(
+            """INSERT OR REPLACE INTO llm_cache (input_hash, model, prompt_version, response_json)
+               VALUES (?, ?, ?, ?)""",
+            (key, CLAUDE_MODEL, PROMPT_VERSION, json.dumps(data)),
+        )
+
+
+def _save_extractions(note_id: int, title: str, content: str, data: dict) -> None:
+    """Persist extracted action items, contacts, and reminders.
+
+    Extraction runs after the request that saved the note has returned, so
+    the results are dropped if the note has since been deleted, edited, or
+    already given extractions by another run for the same text.
+    """
+    with get_db() as db:
+        # Take the write lock before the check so no save can slip in between
+        db.execute("BEGIN IMMEDIATE")
+        current = db.execute(
+            """SELECT 1 FROM notes n
+               WHERE n.id = ? AND n.title = ? AND n.content = ?
+                 AND NOT EXISTS (SELECT 1 FROM action_items WHERE note_id = n.id)
+                 AND NOT EXISTS (SELECT 1 FROM note_contacts WHERE note_id = n.id)""",
+            (note_id, title, content),
+        ).fetchone()
+        if not current:
+            logger.info("Note %d changed or was deleted during extraction; discarding", note_id)
+            return
 
-        # Contacts — upsert by name
+        # Action items
+        db.executemany(
+            "INSERT INTO action_items (note_id, description, due_date) VALUES (?, ?, ?)",
+            [
+                (note_id, item["description"], item.get("due_date", ""))
+                for item in data.get("action_items", [])
+            ],
+        )
+
+        # Contacts — upsert by name, only filling in blank phone/email fields
+        # on contacts that already exist
+        contacts = data.get("contacts", [])
+        db.executemany(
+            """INSERT INTO contacts (name, phone, email) VALUES (?, ?, ?)
+               ON CONFLICT(name) DO UPDATE SET
+                   phone = CASE WHEN contacts.phone = '' THEN excluded.phone ELSE contacts.phone END,
+                   email = CASE WHEN contacts.email = '' THEN excluded.email ELSE contacts.email END""",
+            [(c["name"], c.get("phone") or "", c.get("email") or "") for c in contacts],
+        )
+        # One lookup covers both the extracted contacts and any existing
+        # contacts the reminders name
+        names = {c["name"] for c in contacts}
+        reminders = data.get("reminders", [])
+        lookup = list(names.union(r.get("contact_name", "") for r in reminders))
         contact_map: dict[str, int] = {}
-        for c in data.get("contacts", []):
-            name = c["name"]
-            existing = db.execute(
-                "SELECT id FROM contacts WHERE name = ?", (name,)
-            ).fetchone()
-            if existing:
-                cid = existing["id"]
-                if c.get("phone"):
-                    db.execute(
-                        "UPDATE contacts SET phone = ? WHERE id = ? AND phone = ''",
-                        (c["phone"], cid),
-                    )
-                if c.get("email"):
-                    db.execute(
-                        "UPDATE contacts SET email = ? WHERE id = ? AND email = ''",
-                        (c["email"], cid),
-                    )
-            else:
-                cur = db.execute(
-                    "INSERT INTO contacts (name, phone, email) VALUES (?, ?, ?)",
-                    (name, c.get("phone", ""), c.get("email", "")),
+        if lookup:
+            placeholders = ", ".join("?" * len(lookup))
+            contact_map = {
+                row["name"]: row["id"]
+                for row in db.execute(
+                    f"SELECT id, name FROM contacts WHERE name IN ({placeholders})", lookup
                 )
-                cid = cur.lastrowid
-            contact_map[name] = cid
+            }
 
-            db.execute(
-                "INSERT OR IGNORE INTO note_contacts (note_id, contact_id) VALUES (?, ?)",
-                (note_id, cid),
-            )
+        db.executemany(
+            "INSERT OR IGNORE INTO note_contacts (note_id, contact_id) VALUES (?, ?)",
+            [(note_id, contact_map[name]) for name in names],
+        )
 
         # Reminders
-        for r in data.get("reminders", []):
-            contact_name = r.get("contact_name", "")
-            cid = contact_map.get(contact_name)
-            if not cid:
-                row = db.execute(
-                    "SELECT id FROM contacts WHERE name = ?", (contact_name,)
-                ).fetchone()
-                if row:
-                    cid = row["id"]
-            if cid:
-                db.execute(
-                    "INSERT INTO reminders (contact_id, reminder_type, message, due_date) VALUES (?, ?, ?, ?)",
-                    (cid, r.get("type", "follow_up"), r.get("message", ""), r.get("due_date", "")),
-                )
-
-
-async def extract_text_from_image(image_bytes: bytes, media_type: str) -> str:
+        reminder_rows = [
+            (cid, r.get("type", "follow_up"), r.get("message", ""), r.get("due_date", ""))
+            for r in reminders
+            if (cid := contact_map.get(r.get("contact_name", "")))
+        ]
+        db.executemany(
+            "INSERT INTO reminders (contact_id, reminder_type, message, due_date) VALUES (?, ?, ?, ?)",
+            reminder_rows,
+        )
+
+
+def _data_url(image: bytes | bytearray, media_type: str) -> str:
+    """Base64-encode an image into a data URL.
+
+    Encodes in chunks into one buffer and decodes it once, instead of holding
+    the encoded bytes, their str copy and the formatted URL all at once.
+    """
+    view = memoryview(image)
+    buf = bytearray(f"data:{media_type};base64,".encode())
+    for start in range(0, len(view), _B64_CHUNK_SIZE):
+        buf += base64.standard_b64encode(view[start : start + _B64_CHUNK_SIZE])
+    return buf.decode("ascii")
+
+
+async def extract_text_from_image(image_bytes: bytes | bytearray, media_type: str) -> str:
     """Use OpenAI gpt-5.2 vision API to extract text from an image."""
-    import openai
-
     api_key = os.environ.get("OPENAI_API_KEY", "")
     if not api_key:
         raise ValueError("OPENAI_API_KEY is required for image text extraction")
 
-    image_data = base64.standard_b64encode(image_bytes).decode("utf-8")
-    client = openai.OpenAI(api_key=api_key)
-    response = client.chat.completions.create(
+    response = await _openai_client(api_key).chat.completions.create(
         model="gpt-5.2",
         max_completion_tokens=4096,
         messages=[
@@ -260,7 +431,7 @@ async def extract_text_from_image(image_bytes: bytes, media_type: str) -> str:
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:{media_type};base64,{image_data}",
+                            "url": _data_url(image_bytes, media_type),
                         },
                     },
                     {
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import threading
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -11,20 +13,35 @@ from fastapi.responses import RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
-from mybuddy.db import init_db
+from mybuddy.db import close_pool, init_db, open_pool
 from mybuddy.routes import actions, contacts, notes
 
 BASE_DIR = Path(__file__).resolve().parent
 
 
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    open_pool()
+    yield
+    close_pool()
+
+
 def create_app() -> FastAPI:
     init_db()
 
-    app = FastAPI(title="MyBuddy")
+    app = FastAPI(title="MyBuddy", lifespan=_lifespan)
     app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
 
     templates = Jinja2Templates(directory=BASE_DIR / "templates")
     app.state.templates = templates
+    # The blank note form depends only on constants, so render it once
+    app.state.new_note_html = (
+        templates.get_template("notes/form.html").render(note=None, active="notes").encode()
+    )
+    # Rendered notes list, dropped by the note routes whenever a note changes
+    app.state.notes_list_html = None
+    app.state.notes_list_version = 0
+    app.state.notes_list_lock = threading.Lock()
 
     app.include_router(notes.router)
     app.include_router(actions.router)
@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+import pytest
+
+import mybuddy.db as db_module
+from mybuddy.db import init_db
+
+
+@pytest.fixture(autouse=True)
+def use_temp_db(tmp_path, monkeypatch):
+    """Use a temporary database for each test."""
+    test_db = tmp_path / "test.db"
+    monkeypatch.setattr(db_module, "DB_PATH", test_db)
+    init_db(test_db)
+    yield test_db
+    db_module.close_pool()
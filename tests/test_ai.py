@@ -0,0 +1,389 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import sqlite3
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from mybuddy.db import get_db
+from mybuddy.services.ai import (
+    _anthropic_client,
+    _data_url,
+    _openai_client,
+    _rule_based_extract,
+    _save_extractions,
+    extract_from_note,
+    extract_text_from_image,
+)
+
+
+def _note(db, title="N", content=""):
+    return db.execute(
+        "INSERT INTO notes (title, content) VALUES (?, ?)", (title, content)
+    ).lastrowid
+
+
+def test_save_extractions(use_temp_db):
+    with get_db(use_temp_db) as db:
+        note_id = _note(db)
+
+    _save_extractions(
+        note_id,
+        "N",
+        "",
+        {
+            "action_items": [
+                {"description": "Send deck", "due_date": "2026-01-05"},
+                {"description": "Book room"},
+            ],
+            "contacts": [
+                {"name": "Sarah", "phone": "555", "email": ""},
+                {"name": "Raj", "phone": "", "email": "raj@example.com"},
+            ],
+            "reminders": [
+                {"contact_name": "Sarah", "type": "call", "message": "Call Sarah"},
+                {"contact_name": "Nobody", "type": "call", "message": "Dropped"},
+            ],
+        },
+    )
+
+    with get_db(use_temp_db) as db:
+        actions = db.execute(
+            "SELECT description, due_date FROM action_items WHERE note_id = ? ORDER BY id",
+            (note_id,),
+        ).fetchall()
+        contacts = db.execute(
+            """SELECT c.name, c.phone, c.email FROM contacts c
+               JOIN note_contacts nc ON nc.contact_id = c.id
+               WHERE nc.note_id = ? ORDER BY c.name""",
+            (note_id,),
+        ).fetchall()
+        reminders = db.execute(
+            """SELECT c.name, r.reminder_type, r.message FROM reminders r
+               JOIN contacts c ON c.id = r.contact_id"""
+        ).fetchall()
+    assert [tuple(a) for a in actions] == [("Send deck", "2026-01-05"), ("Book room", "")]
+    assert [tuple(c) for c in contacts] == [
+        ("Raj", "", "raj@example.com"),
+        ("Sarah", "555", ""),
+    ]
+    assert [tuple(r) for r in reminders] == [("Sarah", "call", "Call Sarah")]
+
+
+def test_save_extractions_reuses_existing_contacts(use_temp_db):
+    with get_db(use_temp_db) as db:
+        first = _note(db, "First")
+        second = _note(db, "Second")
+        db.execute("INSERT INTO contacts (name, phone) VALUES (?, ?)", ("Sarah", "111"))
+
+    _save_extractions(
+        first, "First", "", {"contacts": [{"name": "Sarah", "phone": "222", "email": "s@example.com"}]}
+    )
+    _save_extractions(
+        second,
+        "Second",
+        "",
+        {"reminders": [{"contact_name": "Sarah", "type": "follow_up", "message": "Ping"}]},
+    )
+
+    with get_db(use_temp_db) as db:
+        contacts = db.execute("SELECT id, name, phone, email FROM contacts").fetchall()
+        links = db.execute("SELECT note_id FROM note_contacts").fetchall()
+        reminders = db.execute("SELECT contact_id FROM reminders").fetchall()
+    # Existing phone is kept, a missing email is filled in
+    assert [tuple(c)[1:] for c in contacts] == [("Sarah", "111", "s@example.com")]
+    assert [l["note_id"] for l in links] == [first]
+    # Reminders may name contacts saved by earlier notes
+    assert [r["contact_id"] for r in reminders] == [contacts[0]["id"]]
+
+
+def test_save_extractions_ignores_null_contact_fields(use_temp_db):
+    with get_db(use_temp_db) as db:
+        note_id = _note(db)
+        db.execute("INSERT INTO contacts (name) VALUES (?)", ("Sarah",))
+
+    _save_extractions(
+        note_id,
+        "N",
+        "",
+        {
+            "action_items": [{"description": "Call Sarah"}],
+            "contacts": [{"name": "Sarah", "phone": None, "email": None}],
+        },
+    )
+
+    with get_db(use_temp_db) as db:
+        contact = db.execute("SELECT phone, email FROM contacts").fetchone()
+        actions = db.execute("SELECT description FROM action_items").fetchall()
+    assert tuple(contact) == ("", "")
+    assert [a["description"] for a in actions] == ["Call Sarah"]
+
+
+_SEND_DECK = {
+    "action_items": [{"description": "Send deck"}],
+    "contacts": [{"name": "Sarah"}],
+    "reminders": [{"contact_name": "Sarah", "type": "call", "message": "Call Sarah"}],
+}
+
+
+def _extraction_counts(db_path):
+    with get_db(db_path) as db:
+        return tuple(
+            db.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+            for table in ("action_items", "note_contacts", "reminders")
+        )
+
+
+def test_save_extractions_skips_edited_notes(use_temp_db):
+    with get_db(use_temp_db) as db:
+        note_id = _note(db, "N", "send the deck")
+        db.execute("UPDATE notes SET content = ? WHERE id = ?", ("nothing to do", note_id))
+
+    # A run for the old text finishing after the edit
+    _save_extractions(note_id, "N", "send the deck", _SEND_DECK)
+    assert _extraction_counts(use_temp_db) == (0, 0, 0)
+
+    # Two runs for the same text only save once
+    _save_extractions(note_id, "N", "nothing to do", _SEND_DECK)
+    _save_extractions(note_id, "N", "nothing to do", _SEND_DECK)
+    assert _extraction_counts(use_temp_db) == (1, 1, 1)
+
+
+def test_save_extractions_skips_deleted_notes(use_temp_db, caplog):
+    with get_db(use_temp_db) as db:
+        note_id = _note(db, "N", "send the deck")
+        db.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+
+    with caplog.at_level("INFO", logger="mybuddy.services.ai"):
+        _save_extractions(note_id, "N", "send the deck", _SEND_DECK)
+
+    assert _extraction_counts(use_temp_db) == (0, 0, 0)
+    assert "deleted during extraction" in caplog.text
+
+
+def test_rule_based_extract():
+    data = _rule_based_extract(
+        "Meeting with Sarah Lee",
+        "Need to send the budget by Friday. Call John tomorrow. "
+        "Follow up with Priya about hiring. I should review the contract.",
+    )
+    assert [a["description"] for a in data["action_items"]] == [
+        "Need to send the budget by Friday",
+        "should review the contract",
+        "Follow up with Priya about hiring",
+        "Call John tomorrow",
+    ]
+    assert {c["name"] for c in data["contacts"]} == {"Sarah Lee", "John", "Priya"}
+    assert [(r["contact_name"], r["type"], r["message"]) for r in data["reminders"]] == [
+        ("John", "call", "Call John"),
+        ("Priya", "follow_up", "Follow up with Priya"),
+    ]
+
+
+def test_rule_based_extract_keeps_longest_overlapping_action():
+    data = _rule_based_extract(
+        "Random", "todo: buy milk. We need to buy milk and eggs. keep in touch with Omar"
+    )
+    assert [a["description"] for a in data["action_items"]] == [
+        "need to buy milk and eggs",
+        "keep in touch with Omar",
+    ]
+    assert [(r["contact_name"], r["type"]) for r in data["reminders"]] == [("Omar", "follow_up")]
+
+
+def test_rule_based_extract_falls_back_to_lines_for_contacts():
+    data = _rule_based_extract("Coffee with Mark", "Talked about the weather.\nNice time")
+    assert [c["name"] for c in data["contacts"]] == ["Mark"]
+    assert [a["description"] for a in data["action_items"]] == [
+        "Coffee with Mark",
+        "Talked about the weather.",
+        "Nice time",
+    ]
+
+
+def test_rule_based_extract_caps_line_fallback():
+    content = "\r\n".join(f"Discussed topic number {i}" for i in range(100))
+    data = _rule_based_extract("Lunch with Mark", content)
+    descriptions = [a["description"] for a in data["action_items"]]
+    assert len(descriptions) == 10
+    assert descriptions[:2] == ["Lunch with Mark", "Discussed topic number 0"]
+
+
+def test_rule_based_extract_ends_actions_at_line_breaks():
+    data = _rule_based_extract("Standup", "Need to fix the build\nmust email Dana\nlunch was good")
+    assert [a["description"] for a in data["action_items"]] == [
+        "Need to fix the build",
+        "must email Dana",
+    ]
+
+
+@pytest.mark.parametrize("content", ["Please rıng Bob today", "revıew the plan now"])
+def test_rule_based_extract_gate_matches_like_the_patterns(content):
+    # re.IGNORECASE matches these spellings of the keywords; casefold() does not
+    data = _rule_based_extract("Note", content)
+    assert data["action_items"] or data["reminders"]
+
+
+def _claude_reply(text):
+    client = MagicMock()
+    client.messages.create = AsyncMock(
+        return_value=SimpleNamespace(content=[SimpleNamespace(text=text)])
+    )
+    return client
+
+
+_SHIP_IT = '{"action_items": [{"description": "Ship it", "due_date": ""}]}'
+
+
+@pytest.mark.parametrize(
+    "reply",
+    [_SHIP_IT, f"```json\n{_SHIP_IT}\n```", f"```\n{_SHIP_IT}\n``` done", f"```json\n{_SHIP_IT}"],
+    ids=["bare", "fenced", "trailing-text", "unclosed"],
+)
+def test_extract_from_note_uses_claude(use_temp_db, monkeypatch, reply):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    with get_db(use_temp_db) as db:
+        note_id = _note(db, "N", "ship it")
+
+    client = _claude_reply(reply)
+    with patch("mybuddy.services.ai._anthropic_client", return_value=client):
+        asyncio.run(extract_from_note(note_id, "N", "ship it"))
+
+    prompt = client.messages.create.call_args.kwargs["messages"][0]["content"]
+    assert prompt.endswith("text\n\nNote title: N\nNote content:\nship it\n")
+
+    with get_db(use_temp_db) as db:
+        rows = db.execute("SELECT description FROM action_items").fetchall()
+    assert [r["description"] for r in rows] == ["Ship it"]
+
+
+def test_anthropic_client_is_reused():
+    assert _anthropic_client("k") is _anthropic_client("k")
+
+
+def test_extract_from_note_caches_claude_replies(use_temp_db, monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    with get_db(use_temp_db) as db:
+        first = _note(db, "N", "ship it")
+        second = _note(db, "N", "ship it")
+        third = _note(db, "N", "ship it later")
+    client = _claude_reply('{"action_items": [{"description": "Ship it"}]}')
+
+    with patch("mybuddy.services.ai._anthropic_client", return_value=client):
+        asyncio.run(extract_from_note(first, "N", "ship it"))
+        asyncio.run(extract_from_note(second, "N", "ship it"))
+        asyncio.run(extract_from_note(third, "N", "ship it later"))
+
+    assert client.messages.create.await_count == 2
+    with get_db(use_temp_db) as db:
+        rows = db.execute("SELECT note_id FROM action_items ORDER BY id").fetchall()
+    assert [r["note_id"] for r in rows] == [first, second, third]
+
+
+def test_extract_from_note_keeps_reply_when_caching_fails(use_temp_db, monkeypatch, caplog):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    with get_db(use_temp_db) as db:
+        note_id = _note(db, "N", "ship it")
+
+    with (
+        patch("mybuddy.services.ai._anthropic_client", return_value=_claude_reply(_SHIP_IT)),
+        patch("mybuddy.services.ai._store_extraction", side_effect=sqlite3.OperationalError),
+    ):
+        asyncio.run(extract_from_note(note_id, "N", "ship it"))
+
+    with get_db(use_temp_db) as db:
+        rows = db.execute("SELECT description FROM action_items").fetchall()
+    assert [r["description"] for r in rows] == ["Ship it"]
+    assert "Failed to cache AI extraction" in caplog.text
+    assert "falling back" not in caplog.text
+
+
+def test_extract_from_note_treats_cache_read_failure_as_miss(use_temp_db, monkeypatch, caplog):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    with get_db(use_temp_db) as db:
+        note_id = _note(db, "N", "ship it")
+    client = _claude_reply(_SHIP_IT)
+
+    with (
+        patch("mybuddy.services.ai._anthropic_client", return_value=client),
+        patch("mybuddy.services.ai._cached_extraction", side_effect=sqlite3.OperationalError),
+    ):
+        asyncio.run(extract_from_note(note_id, "N", "ship it"))
+
+    client.messages.create.assert_awaited_once()
+    with get_db(use_temp_db) as db:
+        rows = db.execute("SELECT description FROM action_items").fetchall()
+    assert [r["description"] for r in rows] == ["Ship it"]
+    assert "Failed to read cached AI extraction" in caplog.text
+
+
+def test_extract_from_note_expires_cached_replies(use_temp_db, monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    with get_db(use_temp_db) as db:
+        first = _note(db, "N", "ship it")
+        second = _note(db, "N", "ship it")
+    client = _claude_reply(_SHIP_IT)
+
+    with patch("mybuddy.services.ai._anthropic_client", return_value=client):
+        asyncio.run(extract_from_note(first, "N", "ship it"))
+        with get_db(use_temp_db) as db:
+            db.execute("UPDATE llm_cache SET created_at = created_at - 8 * 24 * 60 * 60")
+            db.execute(
+                """INSERT INTO llm_cache (input_hash, model, prompt_version, response_json, created_at)
+                   VALUES ('stale', 'm', 'v0', '{}', 0)"""
+            )
+        asyncio.run(extract_from_note(second, "N", "ship it"))
+
+    assert client.messages.create.await_count == 2
+    with get_db(use_temp_db) as db:
+        # Storing the fresh reply also prunes expired entries
+        assert db.execute("SELECT count(*) FROM llm_cache").fetchone()[0] == 1
+        assert not db.execute("SELECT 1 FROM llm_cache WHERE input_hash = 'stale'").fetchone()
+
+
+def test_extract_from_note_rejects_non_object_replies(use_temp_db, monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    with get_db(use_temp_db) as db:
+        note_id = _note(db, "N", "Need to ship it")
+
+    with patch("mybuddy.services.ai._anthropic_client", return_value=_claude_reply("[]")):
+        asyncio.run(extract_from_note(note_id, "N", "Need to ship it"))
+
+    with get_db(use_temp_db) as db:
+        assert db.execute("SELECT count(*) FROM llm_cache").fetchone()[0] == 0
+        rows = db.execute("SELECT description FROM action_items").fetchall()
+    # Falls back to the rule-based extraction
+    assert [r["description"] for r in rows] == ["Need to ship it"]
+
+
+@pytest.mark.parametrize("size", [0, 1, 5, 6, 7, 100])
+def test_data_url_matches_one_shot_encoding(size, monkeypatch):
+    monkeypatch.setattr("mybuddy.services.ai._B64_CHUNK_SIZE", 6)
+    image = bytes(range(size))
+    expected = "data:image/png;base64," + base64.standard_b64encode(image).decode()
+    assert _data_url(image, "image/png") == expected
+
+
+def test_extract_text_from_image_awaits_openai(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    client = MagicMock()
+    client.chat.completions.create = AsyncMock(
+        return_value=SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="Hello"))]
+        )
+    )
+
+    with patch("mybuddy.services.ai._openai_client", return_value=client):
+        text = asyncio.run(extract_text_from_image(b"img", "image/png"))
+
+    assert text == "Hello"
+    client.chat.completions.create.assert_awaited_once()
+
+
+def test_openai_client_is_async():
+    import openai
+
+    assert isinstance(_openai_client("k"), openai.AsyncOpenAI)
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from typer.testing import CliRunner
+
+from mybuddy.cli import app
+from mybuddy.db import get_db
+
+runner = CliRunner()
+
+
+def test_remind_all_clear():
+    result = runner.invoke(app, ["remind"])
+    assert result.exit_code == 0
+    assert "All clear" in result.output
+
+
+def test_remind_lists_actions_and_reminders(use_temp_db):
+    with get_db(use_temp_db) as db:
+        note_id = db.execute(
+            "INSERT INTO notes (title, content) VALUES (?, ?)", ("Weekly sync", "C")
+        ).lastrowid
+        db.execute(
+            "INSERT INTO action_items (note_id, description) VALUES (?, ?)",
+            (note_id, "Send agenda"),
+        )
+        db.execute(
+            "INSERT INTO action_items (note_id, description, is_completed) VALUES (?, ?, 1)",
+            (note_id, "Old task"),
+        )
+        cid = db.execute("INSERT INTO contacts (name) VALUES (?)", ("Sarah",)).lastrowid
+        db.execute(
+            "INSERT INTO reminders (contact_id, reminder_type, message) VALUES (?, 'call', ?)",
+            (cid, "Call Sarah"),
+        )
+
+    result = runner.invoke(app, ["remind"])
+    assert result.exit_code == 0
+    assert "Send agenda" in result.output
+    assert "Weekly sync" in result.output
+    assert "Old task" not in result.output
+    assert "Call Sarah" in result.output
+    assert result.output.index("Pending Action Items") < result.output.index("Follow-up Reminders")
@@ -1,18 +1,28 @@
 from __future__ import annotations
 
+import sqlite3
 import tempfile
 from pathlib import Path
+from typing import NamedTuple
 
 import pytest
 
-from mybuddy.db import get_db, init_db
+from mybuddy.db import (
+    SCHEMA_VERSION,
+    close_pool,
+    fetchall_as,
+    get_db,
+    init_db,
+    search_notes,
+)
 
 
 @pytest.fixture
 def db_path(tmp_path):
     path = tmp_path / "test.db"
     init_db(path)
-    return path
+    yield path
+    close_pool()
 
 
 def test_schema_creation(db_path):
@@ -127,3 +137,137 @@ def test_contact_unique_name(db_path):
     with pytest.raises(Exception):
         with get_db(db_path) as db:
             db.execute("INSERT INTO contacts (name) VALUES (?)", ("Alice",))
+
+
+def test_indexes_created(db_path):
+    with get_db(db_path) as db:
+        indexes = db.execute(
+            "SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'idx_%'"
+        ).fetchall()
+    names = {i["name"] for i in indexes}
+    assert "idx_action_items_note_id" in names
+    assert "idx_action_items_completed_due" in names
+    assert "idx_note_contacts_contact" in names
+    assert "idx_reminders_contact_dismissed_due" in names
+    assert "idx_notes_updated_at" in names
+
+
+def test_connection_pragmas(db_path):
+    with get_db(db_path) as db:
+        assert db.execute("PRAGMA page_size").fetchone()[0] == 8192
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert db.execute("PRAGMA mmap_size").fetchone()[0] == 268435456
+
+
+def test_get_db_reuses_pooled_connection(db_path):
+    with get_db(db_path) as first:
+        pass
+    with get_db(db_path) as second:
+        assert second is first
+
+
+@pytest.mark.parametrize("exc", [RuntimeError, KeyboardInterrupt])
+def test_get_db_commits_block_as_one_transaction(db_path, exc):
+    with pytest.raises(exc):
+        with get_db(db_path) as db:
+            db.execute("INSERT INTO notes (title, content) VALUES (?, ?)", ("A", ""))
+            assert db.in_transaction
+            db.execute("INSERT INTO notes (title, content) VALUES (?, ?)", ("B", ""))
+            raise exc
+
+    with get_db(db_path) as db:
+        assert db.execute("SELECT COUNT(*) FROM notes").fetchone()[0] == 0
+        assert not db.in_transaction
+
+
+class _TitleRow(NamedTuple):
+    id: int
+    title: str
+
+
+def test_fetchall_as_builds_named_tuples(db_path):
+    with get_db(db_path) as db:
+        db.execute("INSERT INTO notes (title) VALUES (?)", ("First",))
+        rows = fetchall_as(db, _TitleRow, "SELECT id, title FROM notes WHERE id = ?", (1,))
+        assert rows == [_TitleRow(1, "First")]
+        # The connection's own row factory is left alone
+        assert isinstance(db.execute("SELECT 1").fetchone(), sqlite3.Row)
+
+
+def test_search_notes_tracks_note_changes(db_path):
+    with get_db(db_path) as db:
+        cur = db.execute(
+            "INSERT INTO notes (title, content) VALUES (?, ?)",
+            ("Budget", "Review the quarterly contract draft"),
+        )
+        note_id = cur.lastrowid
+        db.execute("INSERT INTO notes (title, content) VALUES (?, ?)", ("Other", "Nothing here"))
+
+    with get_db(db_path) as db:
+        rows = search_notes(db, "contract")
+        assert [r["id"] for r in rows] == [note_id]
+        assert "contract" in rows[0]["snippet"]
+
+        db.execute("UPDATE notes SET content = ? WHERE id = ?", ("Renamed", note_id))
+        assert search_notes(db, "contract") == []
+        assert [r["id"] for r in search_notes(db, "Renamed")] == [note_id]
+
+        db.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+        assert search_notes(db, "Renamed") == []
+
+
+@pytest.mark.parametrize("q", ["%", "_", "\\"])
+def test_search_notes_short_query_matches_wildcards_literally(db_path, q):
+    with get_db(db_path) as db:
+        db.execute("INSERT INTO notes (title, content) VALUES (?, ?)", ("Plain", "nothing"))
+        note_id = db.execute(
+            "INSERT INTO notes (title, content) VALUES (?, ?)", ("Odd", f"50{q} off")
+        ).lastrowid
+
+    with get_db(db_path) as db:
+        assert [r["id"] for r in search_notes(db, q)] == [note_id]
+
+
+def test_init_db_indexes_existing_notes(tmp_path):
+    path = tmp_path / "old.db"
+    init_db(path)
+    with get_db(path) as db:
+        db.execute("DROP TRIGGER notes_fts_insert")
+        db.execute("DROP TRIGGER notes_fts_delete")
+        db.execute("DROP TRIGGER notes_fts_update")
+        db.execute("DROP TABLE notes_fts")
+        db.execute("INSERT INTO notes (title, content) VALUES (?, ?)", ("Old", "legacy text"))
+        db.execute("PRAGMA user_version = 0")
+
+    init_db(path)
+    with get_db(path) as db:
+        assert len(search_notes(db, "legacy")) == 1
+
+
+def test_init_db_skips_schema_when_current(db_path):
+    with get_db(db_path) as db:
+        assert db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        db.execute("DROP INDEX idx_notes_updated_at")
+
+    init_db(db_path)
+    with get_db(db_path) as db:
+        assert not db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'idx_notes_updated_at'"
+        ).fetchone()
+
+
+def test_init_db_analyzes_tables_once_they_have_data(db_path):
+    with get_db(db_path) as db:
+        note_ids = [
+            db.execute("INSERT INTO notes (title) VALUES (?)", (f"Note {i}",)).lastrowid
+            for i in range(50)
+        ]
+        db.executemany(
+            "INSERT INTO action_items (note_id, description) VALUES (?, ?)",
+            [(note_id, "Do it") for note_id in note_ids],
+        )
+
+    init_db(db_path)
+    with get_db(db_path) as db:
+        tables = {r["tbl"] for r in db.execute("SELECT tbl FROM sqlite_stat1")}
+    assert {"notes", "action_items"} <= tables
@@ -8,17 +8,7 @@ from unittest.mock import AsyncMock, patch
 import pytest
 from fastapi.testclient import TestClient
 
-from mybuddy.db import get_db, init_db, DB_PATH
-import mybuddy.db as db_module
-
-
-@pytest.fixture(autouse=True)
-def use_temp_db(tmp_path, monkeypatch):
-    """Use a temporary database for each test."""
-    test_db = tmp_path / "test.db"
-    monkeypatch.setattr(db_module, "DB_PATH", test_db)
-    init_db(test_db)
-    return test_db
+from mybuddy.db import get_db, DB_PATH
 
 
 @pytest.fixture
@@ -43,6 +33,47 @@ def test_notes_list_empty(mock_extract, client):
     assert "No notes yet" in resp.text
 
 
+@patch("mybuddy.routes.notes.extract_from_note", new_callable=AsyncMock)
+def test_notes_list_refreshes_after_writes(mock_extract, client):
+    assert "No notes yet" in client.get("/notes").text
+
+    client.post("/notes", data={"title": "First", "content": "a"})
+    assert "First" in client.get("/notes").text
+
+    client.post("/notes/1/update", data={"title": "Renamed", "content": "a"})
+    resp = client.get("/notes")
+    assert "Renamed" in resp.text
+    assert "First" not in resp.text
+
+    client.delete("/notes/1")
+    assert "No notes yet" in client.get("/notes").text
+
+
+@patch("mybuddy.routes.notes.extract_from_note", new_callable=AsyncMock)
+def test_new_note_form(mock_extract, client):
+    resp = client.get("/notes/new")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/html")
+    assert 'action="/notes"' in resp.text
+    assert 'class="active">Notes' in resp.text
+
+
+@patch("mybuddy.routes.notes.extract_from_note", new_callable=AsyncMock)
+def test_notes_search(mock_extract, client):
+    client.post("/notes", data={"title": "Groceries", "content": "buy <b>milk</b>"})
+    client.post("/notes", data={"title": "Work", "content": "send the report"})
+
+    resp = client.get("/notes", params={"q": "milk"})
+    assert resp.status_code == 200
+    assert "Groceries" in resp.text
+    assert "Work" not in resp.text
+    assert "<mark>milk</mark>" in resp.text
+    assert "&lt;b&gt;" in resp.text
+
+    resp = client.get("/notes", params={"q": "nowhere"})
+    assert "No notes match" in resp.text
+
+
 @patch("mybuddy.routes.notes.extract_from_note", new_callable=AsyncMock)
 def test_create_and_view_note(mock_extract, client):
     resp = client.post(
@@ -51,7 +82,8 @@ def test_create_and_view_note(mock_extract, client):
         follow_redirects=False,
     )
     assert resp.status_code == 303
-    mock_extract.assert_called_once()
+    note_id = int(resp.headers["location"].rsplit("/", 1)[1])
+    mock_extract.assert_called_once_with(note_id, "Test Note", "Call Sarah on Monday")
 
     # Follow redirect to note detail
     location = resp.headers["location"]
@@ -94,6 +126,73 @@ def test_delete_note(mock_extract, client):
     assert resp.status_code == 404
 
 
+def _link_contacts(db, shared_with_other_note: bool):
+    cur = db.execute("INSERT INTO notes (title, content) VALUES (?, ?)", ("N", "C"))
+    note_id = cur.lastrowid
+    only = db.execute("INSERT INTO contacts (name) VALUES (?)", ("Only",)).lastrowid
+    shared = db.execute("INSERT INTO contacts (name) VALUES (?)", ("Shared",)).lastrowid
+    db.execute("INSERT INTO note_contacts (note_id, contact_id) VALUES (?, ?)", (note_id, only))
+    db.execute("INSERT INTO note_contacts (note_id, contact_id) VALUES (?, ?)", (note_id, shared))
+    if shared_with_other_note:
+        other = db.execute("INSERT INTO notes (title, content) VALUES (?, ?)", ("O", "C")).lastrowid
+        db.execute("INSERT INTO note_contacts (note_id, contact_id) VALUES (?, ?)", (other, shared))
+    for cid in (only, shared):
+        db.execute(
+            "INSERT INTO reminders (contact_id, reminder_type, message) VALUES (?, 'call', 'm')",
+            (cid,),
+        )
+    return note_id, only, shared
+
+
+@patch("mybuddy.routes.notes.extract_from_note", new_callable=AsyncMock)
+def test_detail_note_lists_linked_reminders(mock_extract, client, use_temp_db):
+    with get_db(use_temp_db) as db:
+        note_id, only, shared = _link_contacts(db, shared_with_other_note=False)
+        db.execute("UPDATE reminders SET message = 'ring ' || contact_id")
+
+    resp = client.get(f"/notes/{note_id}")
+    assert resp.status_code == 200
+    assert f"ring {only}" in resp.text
+    assert f"ring {shared}" in resp.text
+    assert "(Shared)" in resp.text
+
+
+@patch("mybuddy.routes.notes.extract_from_note", new_callable=AsyncMock)
+def test_update_note_keeps_reminders_of_shared_contacts(mock_extract, client, use_temp_db):
+    with get_db(use_temp_db) as db:
+        note_id, only, shared = _link_contacts(db, shared_with_other_note=True)
+
+    resp = client.post(
+        f"/notes/{note_id}/update",
+        data={"title": "N", "content": "C"},
+        follow_redirects=False,
+    )
+    assert resp.status_code == 303
+
+    with get_db(use_temp_db) as db:
+        remaining = {r["contact_id"] for r in db.execute("SELECT contact_id FROM reminders")}
+        links = db.execute(
+            "SELECT 1 FROM note_contacts WHERE note_id = ?", (note_id,)
+        ).fetchall()
+    assert remaining == {shared}
+    assert links == []
+
+
+@patch("mybuddy.routes.notes.extract_from_note", new_callable=AsyncMock)
+def test_delete_note_removes_orphaned_contacts(mock_extract, client, use_temp_db):
+    with get_db(use_temp_db) as db:
+        note_id, only, shared = _link_contacts(db, shared_with_other_note=True)
+
+    resp = client.delete(f"/notes/{note_id}")
+    assert resp.status_code == 200
+
+    with get_db(use_temp_db) as db:
+        contacts = {r["id"] for r in db.execute("SELECT id FROM contacts")}
+        reminders = {r["contact_id"] for r in db.execute("SELECT contact_id FROM reminders")}
+    assert contacts == {shared}
+    assert reminders == {shared}
+
+
 @patch("mybuddy.routes.notes.extract_from_note", new_callable=AsyncMock)
 def test_actions_list(mock_extract, client, use_temp_db):
     # Insert test data directly
@@ -147,6 +246,43 @@ def test_toggle_action(mock_extract, client, use_temp_db):
     assert "checked" not in resp.text or resp.text.count("checked") == 0
 
 
+@patch("mybuddy.routes.notes.extract_from_note", new_callable=AsyncMock)
+def test_toggle_action_escapes_row(mock_extract, client, use_temp_db):
+    with get_db(use_temp_db) as db:
+        cur = db.execute("INSERT INTO notes (title, content) VALUES (?, ?)", ("N", "C"))
+        db.execute(
+            "INSERT INTO action_items (note_id, description) VALUES (?, ?)",
+            (cur.lastrowid, "<b>Task</b>"),
+        )
+
+    resp = client.post("/actions/1/toggle")
+    assert resp.status_code == 200
+    assert resp.text.lstrip().startswith('<tr id="action-1">')
+    assert "&lt;b&gt;Task&lt;/b&gt;" in resp.text
+    assert "tag completed" in resp.text
+
+
+@pytest.mark.parametrize("has_returning", [True, False])
+@patch("mybuddy.routes.notes.extract_from_note", new_callable=AsyncMock)
+def test_toggle_action_row(mock_extract, client, use_temp_db, monkeypatch, has_returning):
+    monkeypatch.setattr("mybuddy.routes.actions._HAS_RETURNING", has_returning)
+    with get_db(use_temp_db) as db:
+        cur = db.execute("INSERT INTO notes (title, content) VALUES (?, ?)", ("Plan", "C"))
+        db.execute(
+            "INSERT INTO action_items (note_id, description) VALUES (?, ?)",
+            (cur.lastrowid, "Task 1"),
+        )
+
+    resp = client.post("/actions/1/toggle")
+    assert resp.status_code == 200
+    assert ">Plan</a>" in resp.text
+    assert "tag completed" in resp.text
+    with get_db(use_temp_db) as db:
+        assert db.execute("SELECT is_completed FROM action_items").fetchone()[0] == 1
+
+    assert client.post("/actions/99/toggle").status_code == 404
+
+
 @patch("mybuddy.routes.notes.extract_from_note", new_callable=AsyncMock)
 def test_contacts_list(mock_extract, client, use_temp_db):
     with get_db(use_temp_db) as db:
@@ -217,3 +353,31 @@ def test_ocr_successful_extraction(mock_extract, mock_ocr, client):
     assert resp.status_code == 200
     assert "Hello from handwritten notes" in resp.text
     assert "ocr-success" in resp.text
+
+
+@patch("mybuddy.routes.notes.extract_text_from_image", new_callable=AsyncMock)
+@patch("mybuddy.routes.notes.extract_from_note", new_callable=AsyncMock)
+def test_ocr_text_cannot_break_out_of_script(mock_extract, mock_ocr, client):
+    mock_ocr.return_value = "a `${x}` \\ </script><script>alert(1)</script>"
+    fake_image = io.BytesIO(b"\x89PNG\r\n\x1a\n" + b"\x00" * 100)
+    resp = client.post(
+        "/notes/ocr-image",
+        files={"file": ("test.png", fake_image, "image/png")},
+    )
+    assert resp.status_code == 200
+    assert resp.text.count("</script>") == 1
+    assert "\\u003c/script\\u003e" in resp.text
+
+
+@patch("mybuddy.routes.notes.extract_text_from_image", new_callable=AsyncMock)
+@patch("mybuddy.routes.notes.extract_from_note", new_callable=AsyncMock)
+def test_ocr_reads_upload_in_chunks(mock_extract, mock_ocr, client, monkeypatch):
+    monkeypatch.setattr("mybuddy.routes.notes._READ_CHUNK_SIZE", 16)
+    mock_ocr.return_value = "ok"
+    payload = b"\x89PNG\r\n\x1a\n" + bytes(range(100))
+    resp = client.post(
+        "/notes/ocr-image",
+        files={"file": ("test.png", io.BytesIO(payload), "image/png")},
+    )
+    assert resp.status_code == 200
+    assert bytes(mock_ocr.call_args.args[0]) == payload